@@ -1,15 +1,32 @@
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from flask import Flask
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('wechat.log'),
-        logging.StreamHandler()
-    ]
-)
+# Request threads only put records on a queue; a background listener thread
+# does the file and console writes, so disk I/O never blocks a request
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    RotatingFileHandler('wechat.log', maxBytes=50_000_000, backupCount=5, encoding='utf-8'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+# Only merge args into the message here; the listener's handlers add the prefix
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(_queue_handler)
+
+log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 def create_app(config_class=None):
     """Create and configure the Flask application.
@@ -30,6 +47,9 @@ def create_app(config_class=None):
     
     app.config.from_object(config_class)
     
+    # Expose the log listener so it can be stopped on shutdown
+    app.extensions['log_listener'] = log_listener
+    
     # Initialize Celery
     from app.utils.celery_utils import init_celery
     init_celery(app)
@@ -1 +1,34 @@
-# This file makes the source_adapters directory a Python package 
\ No newline at end of file
+# This file makes the source_adapters directory a Python package
+from functools import lru_cache
+from typing import Optional
+
+from app.adapters.source_adapters.wechat_adapter import WechatAdapter
+from app.adapters.source_adapters.wecom_adapter import WecomAdapter
+
+# Source name (lower-cased URL segment) -> adapter class
+REGISTRY = {
+    'wechat': WechatAdapter,
+    'wecom': WecomAdapter,
+}
+
+
+@lru_cache(maxsize=64)
+def get_adapter(source: str, provider: Optional[str] = None, model: Optional[str] = None):
+    """Return the shared adapter for a source and provider/model pair
+    
+    Adapters hold no per-request state, so one instance per combination
+    is built per process and reused by every task. The model comes from the
+    request URL, so the cache is bounded rather than growing per unknown model.
+    
+    Args:
+        source: The source of the request (wechat/wecom)
+        provider: The AI provider name, used to pick WeCom app credentials
+        model: The model label, used to pick WeCom app credentials
+        
+    Returns:
+        The source adapter
+        
+    Raises:
+        KeyError: If the source is unknown
+    """
+    return REGISTRY[source](provider, model)
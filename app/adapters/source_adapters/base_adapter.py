@@ -1,11 +1,40 @@
-from abc import ABC, abstractmethod
 from flask import Request, Response
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Protocol
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-class BaseSourceAdapter(ABC):
-    """Base class for all source adapters"""
+from app.handlers.responses.message_formatter import MessageFormatter
+from app.utils.rate_limiter import RateLimiter
+
+
+def mount_connection_pool(client: Any, pool_size: int = 50) -> Any:
+    """Give a wechatpy client a larger keep-alive connection pool
+
+    wechatpy clients talk to the WeChat API through a ``requests.Session``
+    stored on ``client._http``. Mounting a bigger adapter lets concurrent
+    senders reuse warm TLS connections instead of opening new ones.
+    Failed connects are retried briefly; urllib3 does not re-send POSTs
+    whose request already reached the server, so messages are not duplicated.
+
+    Args:
+        client: The wechatpy client instance
+        pool_size: Number of pooled connections per host
+
+    Returns:
+        The same client, for chaining
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=Retry(total=2, backoff_factor=0.1))
+    client._http.mount('https://', adapter)
+    return client
+
+
+class BaseSourceAdapter(Protocol):
+    """Interface implemented by all source adapters
+    
+    Adapters satisfy it structurally; shared helpers live in AdapterMixin.
+    """
     
-    @abstractmethod
     def verify(self, request: Request) -> Response:
         """Handle verification requests from the source
         
@@ -15,9 +44,8 @@ class BaseSourceAdapter(ABC):
         Returns:
             The appropriate verification response
         """
-        pass
+        ...
     
-    @abstractmethod
     def extract_params(self, request: Request) -> Dict[str, Any]:
         """Extract parameters from the request
         
@@ -27,9 +55,8 @@ class BaseSourceAdapter(ABC):
         Returns:
             A dictionary of extracted parameters
         """
-        pass
+        ...
     
-    @abstractmethod
     def format_response(self, result: Dict[str, Any], params: Dict[str, Any]) -> Response:
         """Format the result for the source
         
@@ -40,9 +67,8 @@ class BaseSourceAdapter(ABC):
         Returns:
             Formatted response for the source
         """
-        pass
+        ...
     
-    @abstractmethod
     def send_message(self, user_id: str, message: str, model: str = "Unknown") -> bool:
         """Send a message to a user
         
@@ -53,22 +79,76 @@ class BaseSourceAdapter(ABC):
         Returns:
             True if the message was sent successfully, False otherwise
         """
-        pass 
+        ...
+    
+    def send_text(self, user_id: str, message: str, model: str = "Unknown",
+                  first_index: int = 1) -> int:
+        """Send text only, numbering its parts from ``first_index``
+        
+        Used for the pieces of a streamed answer, which must not trigger
+        anything send_message adds after the text.
+        
+        Args:
+            user_id: The ID of the user to send the message to
+            message: The message content
+            model: The model name used for the message prefix
+            first_index: Number shown in the prefix of the first part
+            
+        Returns:
+            The number of parts sent
+            
+        Raises:
+            The exception raised by the failing send
+        """
+        ...
+
 
-    # 将长文本按字节数分段
-    def split_content(self, content: str, max_length=2030) -> list:
-        chunks = []
-        current_chunk = ""
-        current_size = 0
-        for char in content:
-            char_size = len(char.encode('utf-8'))
-            if current_size + char_size > max_length:
-                chunks.append(current_chunk)
-                current_chunk = ""
-                current_size = 0
-            current_chunk += char
-            current_size += char_size
+class AdapterMixin:
+    """Concrete helpers shared by source adapters"""
+    
+    __slots__ = ()
+    
+    @staticmethod
+    def xml_response(body: bytes) -> Response:
+        """Wrap a ready-made XML body in a response
+        
+        Builds the Response directly from bytes so Werkzeug neither
+        re-encodes nor wraps the body; Content-Length is set from the bytes.
+        
+        Args:
+            body: The encoded XML document
+            
+        Returns:
+            The Flask response
+        """
+        return Response(body, status=200, mimetype='application/xml', direct_passthrough=True)
+    
+    def dispatch_chunks(self, send_chunk: Callable[[int, str], Any], chunks: list,
+                        limiter: RateLimiter) -> None:
+        """Send message chunks one after another, in order
+        
+        Each send waits for the previous one to finish so the parts of a
+        reply arrive in order; replies to different users still overlap,
+        since each is sent from its own task. Every send takes a token from
+        the limiter first.
         
-        if current_chunk:
-            chunks.append(current_chunk)
-        return chunks
\ No newline at end of file
+        Args:
+            send_chunk: Callable taking (index, chunk) that performs one send
+            chunks: The message chunks, in order
+            limiter: Limiter pacing the start of each send
+            
+        Raises:
+            The first exception raised by any send; later chunks are not sent
+        """
+        for index, chunk in enumerate(chunks):
+            limiter.acquire()
+            send_chunk(index, chunk)
+
+    # 将长文本按字节数分段，并为每段加上 "模型（序号）: " 前缀，序号从 first_index 开始
+    def split_with_prefix(self, message: str, model: str, max_length: int = 2000,
+                          first_index: int = 1) -> list:
+        # 前缀只格式化一次；预留 5 位序号，保证加上前缀后每段仍不超过 max_length 字节
+        prefix_tmpl = f"{model.replace('%', '%%')}（%d）: "
+        budget = max(max_length - len((prefix_tmpl % 99999).encode('utf-8')), 1)
+        return [prefix_tmpl % (first_index + index) + part
+                for index, part in enumerate(MessageFormatter.split_message(message, budget))]
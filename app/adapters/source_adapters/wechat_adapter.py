@@ -1,19 +1,101 @@
 import xml.etree.ElementTree as ET
 import time
 import hashlib
+import hmac
 import logging
+import threading
+from functools import lru_cache
 from typing import Dict, Any
-from flask import Request, Response, make_response
+from flask import Request, Response
 
-from app.adapters.source_adapters.base_adapter import BaseSourceAdapter
+from app.adapters.source_adapters.base_adapter import AdapterMixin, mount_connection_pool
 from app.config.config import Config
-from app.utils.celery_utils import celery
+from app.utils.rate_limiter import RateLimiter
+from app.utils.redis_utils import get_session_storage
 
 logger = logging.getLogger(__name__)
 
-class WechatAdapter(BaseSourceAdapter):
+# Process-wide WeChat client, so the access_token and pooled connections
+# are reused across messages instead of being fetched per send
+_client_lock = threading.Lock()
+_wechat_client = None
+
+# Configuration never changes at runtime, so bind it once at import
+_TOKEN = Config.WECHAT_TOKEN
+_TOKEN_B = _TOKEN.encode('utf-8') if _TOKEN else None
+_APP_ID = Config.WECHAT_APP_ID
+_APP_SECRET = Config.WECHAT_APP_SECRET
+_SEND_QPS = Config.WECHAT_SEND_QPS
+
+# Fixed error bodies, encoded once
+_VERIFICATION_FAILED = b'Verification failed'
+_VERIFICATION_ERROR = b'Verification error'
+
+# 被动回复的 XML 模板，在导入时构建一次，按请求只填充用户和时间
+_IMAGE_MEDIA_ID = b'kaMSmt1j23Az0YO9YonIwAxlsBmITjQUf_7ggkVu4E3rpxhJqXjBhefOBho46nIJ'
+_IMAGE_RESPONSE_TMPL = (
+    b'<xml>'
+    b'<ToUserName><![CDATA[%b]]></ToUserName>'
+    b'<FromUserName><![CDATA[%b]]></FromUserName>'
+    b'<CreateTime>%d</CreateTime>'
+    b'<MsgType><![CDATA[image]]></MsgType>'
+    b'<Image><MediaId><![CDATA[' + _IMAGE_MEDIA_ID + b']]></MediaId></Image>'
+    b'</xml>'
+)
+
+
+# 按消息类型提取各自需要的字段
+def _parse_text_fields(root, params: Dict[str, Any]) -> None:
+    params['content'] = root.findtext('Content') or ''
+
+
+def _parse_image_fields(root, params: Dict[str, Any]) -> None:
+    params['pic_url'] = root.findtext('PicUrl')
+    params['media_id'] = root.findtext('MediaId')
+
+
+def _parse_event_fields(root, params: Dict[str, Any]) -> None:
+    params['event'] = root.findtext('Event')
+
+
+_MESSAGE_FIELD_PARSERS = {
+    'text': _parse_text_fields,
+    'image': _parse_image_fields,
+    'event': _parse_event_fields,
+}
+
+
+def _get_client():
+    """Return the shared WeChatClient, creating it on first use"""
+    global _wechat_client
+    if _wechat_client is None:
+        with _client_lock:
+            if _wechat_client is None:
+                from wechatpy import WeChatClient
+                client = WeChatClient(_APP_ID, _APP_SECRET,
+                                      session=get_session_storage('wechat'))
+                _wechat_client = mount_connection_pool(client)
+    return _wechat_client
+
+
+@lru_cache(maxsize=1024)
+def _get_send_limiter(user_id: str) -> RateLimiter:
+    """Return the send limiter shared by every task replying to one user"""
+    return RateLimiter(_SEND_QPS)
+
+
+class WechatAdapter(AdapterMixin):
     """Adapter for handling WeChat Official Account requests"""
     
+    __slots__ = ()
+    
+    def __init__(self, provider=None, model=None):
+        """Initialize the WeChat adapter
+        
+        The official account has a single app, so provider and model are
+        accepted for a uniform constructor but not used.
+        """
+    
     def verify(self, request: Request) -> Response:
         """Handle WeChat signature verification (GET requests)
         
@@ -24,29 +106,36 @@ class WechatAdapter(BaseSourceAdapter):
             The verification response
         """
         try:
-            signature = request.args.get('signature', '')
-            timestamp = request.args.get('timestamp', '')
-            nonce = request.args.get('nonce', '')
-            echostr = request.args.get('echostr', '')
+            args = request.args
+            signature = args.get('signature', '')
+            timestamp = args.get('timestamp', '')
+            nonce = args.get('nonce', '')
+            echostr = args.get('echostr', '')
+            
+            if _TOKEN_B is None:
+                raise ValueError("WECHAT_TOKEN is not configured")
             
             # Sort token, timestamp, and nonce lexicographically
-            token = Config.WECHAT_TOKEN
-            temp_list = [token, timestamp, nonce]
-            temp_list.sort()
+            # (UTF-8 byte order matches code point order)
+            parts = sorted((_TOKEN_B, timestamp.encode('utf-8'), nonce.encode('utf-8')))
             
-            # Join the list into a string and hash it
-            temp_str = ''.join(temp_list)
-            hashcode = hashlib.sha1(temp_str.encode('utf-8')).hexdigest()
+            # Hash the parts in order without building a joined string;
+            # hashlib.sha1 is OpenSSL's implementation (SHA-NI when available)
+            h = hashlib.sha1(parts[0])
+            h.update(parts[1])
+            h.update(parts[2])
+            hashcode = h.hexdigest().encode('ascii')
             
-            # Verify the signature
-            if hashcode == signature:
-                return echostr
+            # Verify the signature (constant-time comparison); compare bytes,
+            # since compare_digest rejects non-ASCII str arguments
+            if hmac.compare_digest(hashcode, signature.encode('utf-8')):
+                return Response(echostr.encode('utf-8'), mimetype='text/plain')
             else:
                 logger.warning("WeChat signature verification failed")
-                return make_response("Verification failed", 403)
+                return Response(_VERIFICATION_FAILED, status=403)
         except Exception as e:
             logger.error(f"WeChat verification error: {str(e)}")
-            return make_response("Verification error", 500)
+            return Response(_VERIFICATION_ERROR, status=500)
     
     def extract_params(self, request: Request) -> Dict[str, Any]:
         """Extract parameters from WeChat request
@@ -61,22 +150,18 @@ class WechatAdapter(BaseSourceAdapter):
         root = ET.fromstring(xml_data)
         
         params = {
-            'msg_type': root.find('MsgType').text,
-            'from_user': root.find('FromUserName').text,
-            'to_user': root.find('ToUserName').text,
-            'create_time': int(root.find('CreateTime').text)
+            'msg_type': root.findtext('MsgType'),
+            'from_user': root.findtext('FromUserName'),
+            'to_user': root.findtext('ToUserName'),
+            'create_time': int(root.findtext('CreateTime'))
         }
         
         # Handle different message types
-        if params['msg_type'] == 'text':
-            params['content'] = root.find('Content').text
-        elif params['msg_type'] == 'image':
-            params['pic_url'] = root.find('PicUrl').text
-            params['media_id'] = root.find('MediaId').text
-        elif params['msg_type'] == 'event':
-            params['event'] = root.find('Event').text
+        parse_fields = _MESSAGE_FIELD_PARSERS.get(params['msg_type'])
+        if parse_fields:
+            parse_fields(root, params)
             
-        logger.info(f"Extracted WeChat parameters: {params}")
+        logger.info("Extracted WeChat parameters: %s", params)
         return params
     
     def format_response(self, result: Dict[str, Any], params: Dict[str, Any]) -> Response:
@@ -89,7 +174,7 @@ class WechatAdapter(BaseSourceAdapter):
                 "正在思考，请稍候..."
             )
             
-            return make_response(initial_response)
+            return self.xml_response(initial_response)
         else:
             # For synchronous responses, return the result directly
             response_text = result.get('content', 'No response from AI provider')
@@ -98,9 +183,9 @@ class WechatAdapter(BaseSourceAdapter):
                 params['from_user'], 
                 response_text
             )
-            return make_response(xml_response)
+            return self.xml_response(xml_response)
     
-    def _build_text_response(self, from_user: str, to_user: str, content: str) -> str:
+    def _build_text_response(self, from_user: str, to_user: str, content: str) -> bytes:
         """Build a text response in WeChat XML format
         
         Args:
@@ -109,28 +194,11 @@ class WechatAdapter(BaseSourceAdapter):
             content: The message content
             
         Returns:
-            XML string in WeChat format
+            XML bytes in WeChat format
         """
-        # 立即返回文本
-#         return f"""
-# <xml>
-#     <ToUserName><![CDATA[{to_user}]]></ToUserName>
-#     <FromUserName><![CDATA[{from_user}]]></FromUserName>
-#     <CreateTime>{int(time.time())}</CreateTime>
-#     <MsgType><![CDATA[text]]></MsgType>
-#     <Content><![CDATA[{content}]]></Content>
-# </xml>"""
-        # 立即返回图片
-        return f"""
-<xml>
-    <ToUserName><![CDATA[{to_user}]]></ToUserName>
-    <FromUserName><![CDATA[{from_user}]]></FromUserName>
-    <CreateTime>{int(time.time())}</CreateTime>
-    <MsgType><![CDATA[image]]></MsgType>
-    <Image>
-        <MediaId><![CDATA[kaMSmt1j23Az0YO9YonIwAxlsBmITjQUf_7ggkVu4E3rpxhJqXjBhefOBho46nIJ]]></MediaId>
-    </Image>
-</xml>"""
+        # 立即返回图片；content 暂不使用
+        return _IMAGE_RESPONSE_TMPL % (
+            to_user.encode('utf-8'), from_user.encode('utf-8'), int(time.time()))
     
     def send_message(self, user_id: str, message: str, model: str = "Unknown") -> bool:
         """Send a message to a WeChat user
@@ -143,17 +211,10 @@ class WechatAdapter(BaseSourceAdapter):
             True if successful, False otherwise
         """
         try:
-            from wechatpy import WeChatClient
-            client = WeChatClient(Config.WECHAT_APP_ID, Config.WECHAT_APP_SECRET)
-            # 分段发送
-            for index, chunk in enumerate(self.split_content(message, 2000)):
-                client.message.send_text(
-                    user_id,
-                    f"{model}（{index+1}）: {chunk}"
-                )
-                time.sleep(1)  # 避免发送频率过高
+            self.send_text(user_id, message, model)
+            client = _get_client()
             # 测试发送图片
-            client.message.send_image(user_id, "kaMSmt1j23Az0YO9YonIwAxlsBmITjQUf_7ggkVu4E3rpxhJqXjBhefOBho46nIJ")
+            client.message.send_image(user_id, _IMAGE_MEDIA_ID.decode())
             # 测试发送图文
             articles = [{
                 "title": "标题（可选）",
@@ -165,4 +226,28 @@ class WechatAdapter(BaseSourceAdapter):
             return True
         except Exception as e:
             logger.error(f"Error sending WeChat message: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def send_text(self, user_id: str, message: str, model: str = "Unknown",
+                  first_index: int = 1) -> int:
+        """Send only the text of a message to a WeChat user
+        
+        Args:
+            user_id: The WeChat user ID
+            message: The message content
+            model: The model name used for the message prefix
+            first_index: Number shown in the prefix of the first part
+            
+        Returns:
+            The number of parts sent
+        """
+        client = _get_client()
+        chunks = self.split_with_prefix(message, model, 2000, first_index)
+        # 分段依次发送，保证各段按顺序到达；按令牌桶限速，只在发送过快时才等待，
+        # 限速器按用户共享：同一用户的并发任务合计不超过 _SEND_QPS，不同用户互不等待
+        self.dispatch_chunks(
+            lambda index, content: client.message.send_text(user_id, content),
+            chunks,
+            _get_send_limiter(user_id)
+        )
+        return len(chunks)
\ No newline at end of file
@@ -1,20 +1,123 @@
+import xml.etree.ElementTree as ET
+import itertools
 import logging
+import os
 import time
+from functools import lru_cache
 from typing import Dict, Any
-from flask import Request, Response, make_response
+from flask import Request, Response
 
 from wechatpy.enterprise.crypto import WeChatCrypto
-from wechatpy.enterprise import parse_message, WeChatClient
+from wechatpy.enterprise import WeChatClient
 
-from app.adapters.source_adapters.base_adapter import BaseSourceAdapter
+from app.adapters.source_adapters.base_adapter import AdapterMixin, mount_connection_pool
 from app.config.config import Config
-from app.utils.celery_utils import celery
+from app.utils.rate_limiter import RateLimiter
+from app.utils.redis_utils import get_session_storage
 
 logger = logging.getLogger(__name__)
 
-class WecomAdapter(BaseSourceAdapter):
+# Configuration never changes at runtime, so bind it once at import
+_TOKEN = Config.WECOM_TOKEN
+_ENCODING_AES_KEY = Config.WECOM_ENCODING_AES_KEY
+_CORP_ID = Config.WECOM_CORP_ID
+_APP_SECRET_DEFAULT = Config.WECOM_APP_SECRET_DEFAULT
+_AGENT_ID_DEFAULT = Config.WECOM_AGENT_ID_DEFAULT
+_SEND_QPS = Config.WECOM_SEND_QPS
+
+# Fallback nonces: process id plus a per-process counter, unique without
+# touching os.urandom; the pid is refreshed in forked workers
+_nonce_counter = itertools.count()
+_pid = os.getpid()
+
+
+def _reset_nonce_source() -> None:
+    global _nonce_counter, _pid
+    _nonce_counter = itertools.count()
+    _pid = os.getpid()
+
+
+os.register_at_fork(after_in_child=_reset_nonce_source)
+
+
+def _next_nonce() -> str:
+    return f"{_pid:x}n{next(_nonce_counter):x}"
+
+# Fixed error bodies, encoded once
+_VERIFICATION_ERROR = b'Verification error'
+_PROCESSING_ERROR = b'Error processing request'
+
+# 被动回复的 XML 模板，在导入时按占位符拆分编码一次，按请求只拼接用户和时间
+_REPLY_PREFIX = b'<xml><ToUserName><![CDATA['
+_REPLY_FROM = b']]></ToUserName><FromUserName><![CDATA['
+_REPLY_TIME = b']]></FromUserName><CreateTime>'
+_REPLY_SUFFIX = (
+    b'</CreateTime>'
+    b'<MsgType><![CDATA[text]]></MsgType>'
+    b'<Content><![CDATA[' + '正在思考，请稍候...'.encode('utf-8') + b']]></Content>'
+    b'</xml>'
+)
+
+
+# 按消息类型提取各自需要的字段
+def _parse_text_fields(root, params: Dict[str, Any]) -> None:
+    params['content'] = root.findtext('Content') or ''
+
+
+def _parse_image_fields(root, params: Dict[str, Any]) -> None:
+    params['media_id'] = root.findtext('MediaId')
+
+
+def _parse_event_fields(root, params: Dict[str, Any]) -> None:
+    params['event'] = (root.findtext('Event') or '').lower()
+    params['event_key'] = root.findtext('EventKey') or ''
+
+
+_MESSAGE_FIELD_PARSERS = {
+    'text': _parse_text_fields,
+    'image': _parse_image_fields,
+    'event': _parse_event_fields,
+}
+
+
+@lru_cache(maxsize=64)
+def _credential_key(provider: str, model: str) -> str:
+    """Build the Config.WECOM_CREDENTIALS key for a provider/model pair
+    
+    Special characters that are not valid in env var names become underscores.
+    """
+    return f"{provider}_{model}".upper().replace("-", "_").replace(".", "_").replace("－", "_").replace(":", "_")
+
+
+@lru_cache(maxsize=8)
+def _get_crypto(token: str, encoding_aes_key: str, corp_id: str) -> WeChatCrypto:
+    """Return a shared WeChatCrypto, so the AES key is base64-decoded once per process"""
+    return WeChatCrypto(token, encoding_aes_key, corp_id)
+
+
+@lru_cache(maxsize=32)
+def _get_client(corp_id: str, app_secret: str) -> WeChatClient:
+    """Return the shared WeCom client for an application, creating it on first use
+    
+    Each client caches its access_token in the shared Redis when one is
+    configured, so all workers reuse a single token per application.
+    """
+    session = get_session_storage(f'wecom:{corp_id}', app_secret)
+    return mount_connection_pool(WeChatClient(corp_id, app_secret, session=session))
+
+
+@lru_cache(maxsize=32)
+def _get_send_limiter(corp_id: str, app_secret: str) -> RateLimiter:
+    """Return the send limiter shared by every task sending through one application"""
+    return RateLimiter(_SEND_QPS)
+
+
+class WecomAdapter(AdapterMixin):
     """Adapter for handling WeCom (Enterprise WeChat) requests"""
     
+    __slots__ = ('token', 'encoding_aes_key', 'corp_id', 'app_secret', 'agent_id',
+                 'crypto', 'provider', 'model')
+    
     def __init__(self, provider=None, model=None):
         """Initialize the WeCom adapter with its crypto instance
         
@@ -22,34 +125,29 @@ class WecomAdapter(BaseSourceAdapter):
             provider: The AI provider name (e.g., 'Groq', 'Tongyiqianwen')
             model: The model name (e.g., 'deepseek-r1-distill-llama-70b', 'QWQ-Plus')
         """
-        self.token = Config.WECOM_TOKEN
-        self.encoding_aes_key = Config.WECOM_ENCODING_AES_KEY
-        self.corp_id = Config.WECOM_CORP_ID
+        self.token = _TOKEN
+        self.encoding_aes_key = _ENCODING_AES_KEY
+        self.corp_id = _CORP_ID
         
         # Set default agent_id and app_secret
-        self.app_secret = Config.WECOM_APP_SECRET_DEFAULT
-        self.agent_id = Config.WECOM_AGENT_ID_DEFAULT
+        self.app_secret = _APP_SECRET_DEFAULT
+        self.agent_id = _AGENT_ID_DEFAULT
         
         # If provider and model are specified, try to get the corresponding credentials
         if provider and model:
-            # Create a key for environment variable lookup
-            # Replace special characters that might not be valid in env var names
-            env_key = f"{provider}_{model}".upper().replace("-", "_").replace(".", "_").replace("－", "_").replace(":", "_")
-            
-            # Try to get app_secret for this provider/model combination
-            app_secret_var = f"WECOM_APP_SECRET_{env_key}"
-            agent_id_var = f"WECOM_AGENT_ID_{env_key}"
+            app_secret, agent_id = Config.WECOM_CREDENTIALS.get(
+                _credential_key(provider, model), (None, None))
             
-            if hasattr(Config, app_secret_var) and getattr(Config, app_secret_var):
-                self.app_secret = getattr(Config, app_secret_var)
-                logger.info(f"Using custom app_secret for {provider}/{model}")
+            if app_secret:
+                self.app_secret = app_secret
+                logger.info("Using custom app_secret for %s/%s", provider, model)
             
-            if hasattr(Config, agent_id_var) and getattr(Config, agent_id_var):
-                self.agent_id = getattr(Config, agent_id_var)
-                logger.info(f"Using custom agent_id for {provider}/{model}")
+            if agent_id:
+                self.agent_id = agent_id
+                logger.info("Using custom agent_id for %s/%s", provider, model)
         
         # Initialize crypto
-        self.crypto = WeChatCrypto(self.token, self.encoding_aes_key, self.corp_id)
+        self.crypto = _get_crypto(self.token, self.encoding_aes_key, self.corp_id)
         
         # Save the provider and model for reference
         self.provider = provider
@@ -81,7 +179,7 @@ class WecomAdapter(BaseSourceAdapter):
             return decrypted_echostr
         except Exception as e:
             logger.error(f"WeCom verification error: {str(e)}")
-            return make_response("Verification error", 500)
+            return Response(_VERIFICATION_ERROR, status=500)
     
     def extract_params(self, request: Request) -> Dict[str, Any]:
         """Extract parameters from WeCom request
@@ -107,27 +205,27 @@ class WecomAdapter(BaseSourceAdapter):
                 nonce
             )
             
-            # Parse the XML to get message object
-            msg = parse_message(decrypted_xml)
+            # Read only the fields we use straight from the decrypted XML,
+            # instead of building a full wechatpy message object
+            root = ET.fromstring(decrypted_xml)
             
             # Extract parameters based on message type
             params = {
-                'msg_type': msg.type,
-                'from_user': msg.source,
-                'to_user': msg.target,
-                'create_time': msg.create_time,
+                'msg_type': (root.findtext('MsgType') or '').lower(),
+                'from_user': root.findtext('FromUserName'),
+                'to_user': root.findtext('ToUserName'),
+                'create_time': int(root.findtext('CreateTime') or 0),
+                # Echoed back when encrypting the passive reply
+                'nonce': nonce,
+                'timestamp': timestamp,
             }
             
             # Handle different message types
-            if msg.type == 'text':
-                params['content'] = msg.content
-            elif msg.type == 'image':
-                params['media_id'] = msg.media_id
-            elif msg.type == 'event':
-                params['event'] = msg.event
-                params['event_key'] = getattr(msg, 'key', '')
-            
-            logger.info(f"Extracted WeCom parameters: {params}")
+            parse_fields = _MESSAGE_FIELD_PARSERS.get(params['msg_type'])
+            if parse_fields:
+                parse_fields(root, params)
+            
+            logger.info("Extracted WeCom parameters: %s", params)
             return params
             
         except Exception as e:
@@ -148,26 +246,30 @@ class WecomAdapter(BaseSourceAdapter):
         try:
             # For WeCom, we always respond immediately with a simple message
             # and then process the AI response asynchronously
-            reply_xml = f"""<xml>
-                <ToUserName><![CDATA[{params['from_user']}]]></ToUserName>
-                <FromUserName><![CDATA[{params['to_user']}]]></FromUserName>
-                <CreateTime>{int(time.time())}</CreateTime>
-                <MsgType><![CDATA[text]]></MsgType>
-                <Content><![CDATA[正在思考，请稍候...]]></Content>
-            </xml>"""
-            
-            # Encrypt the response
+            # Reuse the callback's timestamp so CreateTime and the signed
+            # timestamp match what WeCom sent; sample the clock only without one
+            timestamp = params.get('timestamp')
+            if not (timestamp and timestamp.isascii() and timestamp.isdigit()):
+                timestamp = str(int(time.time()))
+            reply_xml = b''.join((
+                _REPLY_PREFIX, params['from_user'].encode('utf-8'),
+                _REPLY_FROM, params['to_user'].encode('utf-8'),
+                _REPLY_TIME, timestamp.encode('ascii'),
+                _REPLY_SUFFIX
+            ))
+            
+            # Encrypt the response (wechatpy accepts bytes directly)
             encrypted_xml = self.crypto.encrypt_message(
                 reply_xml,
-                nonce=params.get('nonce', str(int(time.time()))),
-                timestamp=str(int(time.time()))
+                nonce=params.get('nonce') or _next_nonce(),
+                timestamp=timestamp
             )
             
-            return make_response(encrypted_xml)
+            return self.xml_response(encrypted_xml.encode('utf-8'))
             
         except Exception as e:
             logger.error(f"Error formatting WeCom response: {str(e)}")
-            return make_response("Error processing request", 500)
+            return Response(_PROCESSING_ERROR, status=500)
     
     def send_message(self, user_id: str, message: str, model: str = "Unknown") -> bool:
         """Send a message to a WeCom user
@@ -181,19 +283,39 @@ class WecomAdapter(BaseSourceAdapter):
             True if successful, False otherwise
         """
         try:
-            client = WeChatClient(
-                self.corp_id,
-                self.app_secret  # Using the instance-specific app_secret
-            )
-            # 分段发送
-            for index, chunk in enumerate(self.split_content(message, 2000)):
-                client.message.send_text(
-                    agent_id=self.agent_id,  # Using the instance-specific agent_id
-                    user_ids=[user_id],  # Wrap user_id in a list
-                    content=f"{model}（{index+1}）: {chunk}"
-                )
-                time.sleep(1)  # 避免发送频率过高
+            self.send_text(user_id, message, model)
             return True
         except Exception as e:
             logger.error(f"Error sending WeCom message: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def send_text(self, user_id: str, message: str, model: str = "Unknown",
+                  first_index: int = 1) -> int:
+        """Send only the text of a message to a WeCom user
+        
+        Args:
+            user_id: The WeCom user ID
+            message: The message content
+            model: The model name used for the message prefix
+            first_index: Number shown in the prefix of the first part
+            
+        Returns:
+            The number of parts sent
+        """
+        client = _get_client(
+            self.corp_id,
+            self.app_secret  # Using the instance-specific app_secret
+        )
+        agent_id = self.agent_id  # Using the instance-specific agent_id
+        chunks = self.split_with_prefix(message, model, 2000, first_index)
+        # 分段依次发送，保证各段按顺序到达；按应用共享的令牌桶限速避免发送频率过高
+        self.dispatch_chunks(
+            lambda index, content: client.message.send_text(
+                agent_id=agent_id,
+                user_ids=[user_id],  # Wrap user_id in a list
+                content=content
+            ),
+            chunks,
+            _get_send_limiter(self.corp_id, self.app_secret)
+        )
+        return len(chunks)
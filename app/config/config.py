@@ -12,21 +12,36 @@ class Config:
     # Celery configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
-    CELERY_TASK_SERIALIZER = 'json'
-    CELERY_RESULT_SERIALIZER = 'json'
-    CELERY_ACCEPT_CONTENT = ['json']
+    CELERY_TASK_SERIALIZER = 'orjson'
+    CELERY_RESULT_SERIALIZER = 'orjson'
+    # Plain json is still accepted so messages queued before the switch are consumed
+    CELERY_ACCEPT_CONTENT = ['orjson', 'json']
     CELERY_TIMEZONE = 'Asia/Shanghai'
     CELERY_ENABLE_UTC = True
+    # Compress task messages on the broker (kombu registers zstd when zstandard is installed)
+    CELERY_TASK_COMPRESSION = os.environ.get('CELERY_TASK_COMPRESSION', 'zstd') or None
+    # Reuse broker connections across publishes instead of connecting per task;
+    # sized to the worker concurrency so concurrent tasks do not wait on the pool
+    CELERY_BROKER_POOL_LIMIT = int(os.environ.get('CELERY_BROKER_POOL_LIMIT')
+                                   or os.environ.get('CELERY_WORKER_CONCURRENCY', 32))
+    CELERY_BROKER_CONNECTION_TIMEOUT = float(os.environ.get('CELERY_BROKER_CONNECTION_TIMEOUT', 4))
+    
+    # Redis shared across workers (e.g. WeChat access_tokens); defaults to the broker
+    REDIS_URL = os.environ.get('REDIS_URL') or CELERY_BROKER_URL
     
     # WeChat Official Account configuration
     WECHAT_TOKEN = os.environ.get('WECHAT_TOKEN')
     WECHAT_APP_ID = os.environ.get('WECHAT_APP_ID')
     WECHAT_APP_SECRET = os.environ.get('WECHAT_APP_SECRET')
+    # Max customer-service messages per second to one user when sending a split reply
+    WECHAT_SEND_QPS = float(os.environ.get('WECHAT_SEND_QPS', 1))
     
     # WeCom (Enterprise WeChat) configuration
     WECOM_TOKEN = os.environ.get('WECOM_TOKEN')
     WECOM_ENCODING_AES_KEY = os.environ.get('WECOM_ENCODING_AES_KEY')
     WECOM_CORP_ID = os.environ.get('WECOM_CORP_ID')
+    # Max messages per second when sending a split reply (WeCom allows ~20/s per app)
+    WECOM_SEND_QPS = float(os.environ.get('WECOM_SEND_QPS', 10))
 
     # WeCom: Default app_secret and agent_id
     WECOM_APP_SECRET_DEFAULT=os.environ.get('WECOM_APP_SECRET_DEFAULT')
@@ -118,10 +133,91 @@ class Config:
     TENCENT_API_BASE = os.environ.get('TENCENT_API_BASE')
     TENCENT_API_KEY = os.environ.get('TENCENT_API_KEY')
     TENCENT_MODEL_DEEPSEEK_R1_671B = os.environ.get('TENCENT_MODEL_DEEPSEEK_R1_671B')
+    TENCENT_MODEL = os.environ.get('TENCENT_MODEL')
+    
+    # Worker pool: tasks mostly wait on LLM HTTP calls, so threads let many overlap
+    CELERY_WORKER_POOL = os.environ.get('CELERY_WORKER_POOL', 'threads')
+    CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', 32))
+    # With CELERY_WORKER_POOL=prefork, recycle child processes after this many tasks
+    # or this much RSS (KiB) to bound leaks; left unset for other pools
+    CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.environ.get('CELERY_WORKER_MAX_TASKS_PER_CHILD', 200))
+    CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(os.environ.get('CELERY_WORKER_MAX_MEMORY_PER_CHILD', 524288))
+    
+    # Each provider's tasks go to their own queue so slow models cannot starve fast ones
+    CELERY_PROVIDER_QUEUES = ['deepseek', 'geekai', 'groq', 'tencent', 'tongyiqianwen']
+    # Non-durable queues and transient messages: a lost reply costs less than broker fsyncs
+    CELERY_TRANSIENT_QUEUES = os.environ.get('CELERY_TRANSIENT_QUEUES', 'true').lower() in ('1', 'true', 'yes')
+    # Queues this worker consumes (comma-separated); defaults to all of them
+    CELERY_WORKER_QUEUES = os.environ.get('CELERY_WORKER_QUEUES') or ','.join(['celery', *CELERY_PROVIDER_QUEUES])
+    
+    # Per-provider task rate limits in Celery syntax (e.g. '30/m'); unset means unlimited
+    PROVIDER_RATE_LIMITS = {
+        'deepseek': os.environ.get('DEEPSEEK_RATE_LIMIT'),
+        'geekai': os.environ.get('GEEKAI_RATE_LIMIT'),
+        'groq': os.environ.get('GROQ_RATE_LIMIT'),
+        'tencent': os.environ.get('TENCENT_RATE_LIMIT'),
+        'tongyiqianwen': os.environ.get('TONGYIQIANWEN_RATE_LIMIT'),
+    }
+    
+    # Seconds an LLM call may wait for the next bytes (each stream chunk resets it)
+    LLM_READ_TIMEOUT = float(os.environ.get('LLM_READ_TIMEOUT', 300))
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+    # Multiplex concurrent LLM calls over one HTTP/2 connection per endpoint;
+    # endpoints that do not offer h2 via ALPN are spoken to over HTTP/1.1
+    LLM_HTTP2 = os.environ.get('LLM_HTTP2', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Times a task is re-queued with backoff after the provider answers 429
+    LLM_RATE_LIMIT_RETRIES = int(os.environ.get('LLM_RATE_LIMIT_RETRIES', 3))
+    
+    # Smallest completion budget requested; reasoning models spend much of it thinking
+    LLM_MIN_MAX_TOKENS = int(os.environ.get('LLM_MIN_MAX_TOKENS', 8192))
+    
+    # Send streamed answers to the user in pieces as they arrive instead of all at the end
+    STREAM_TO_USER = os.environ.get('STREAM_TO_USER', 'false').lower() in ('1', 'true', 'yes')
+    # Characters buffered before a streamed piece is sent
+    STREAM_FLUSH_CHARS = int(os.environ.get('STREAM_FLUSH_CHARS', 600))
+    # Seconds after which buffered text is sent early if it ends a sentence
+    STREAM_FLUSH_SECONDS = float(os.environ.get('STREAM_FLUSH_SECONDS', 3))
+    # Stream chunks between checks for a newer message from the same user,
+    # which abandons the older stream; 0 disables the check
+    LLM_CANCEL_CHECK_CHUNKS = int(os.environ.get('LLM_CANCEL_CHECK_CHUNKS', 50))
+    
+    # Seconds to keep answers for identical queries; 0 disables the cache
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 3600))
     
     # HTTP Proxy configuration (if needed)
     HTTP_PROXY = os.environ.get('HTTP_PROXY')
-    
-    # Tencent configurations
-    TENCENT_API_KEY = os.environ.get('TENCENT_API_KEY')
-    TENCENT_MODEL = os.environ.get('TENCENT_MODEL') 
\ No newline at end of file
+
+
+def _collect_wecom_credentials(config, environ=os.environ) -> dict:
+    """Index the per-model WeCom credentials from the config class and environment
+
+    Credentials declared on the class are picked up first; any other
+    ``WECOM_APP_SECRET_*`` / ``WECOM_AGENT_ID_*`` variables in the environment
+    are included too, so a new model app only needs its env vars set.
+
+    Returns:
+        A dict mapping the env key suffix (e.g. ``GROQ_DEEPSEEK_R1_DISTILL_LLAMA_70B``)
+        to an ``(app_secret, agent_id)`` tuple; either value may be None
+    """
+    secret_prefix = 'WECOM_APP_SECRET_'
+    agent_prefix = 'WECOM_AGENT_ID_'
+    credentials = {}
+    for name in (*dir(config), *environ):
+        if name.startswith(secret_prefix):
+            key = name[len(secret_prefix):]
+        elif name.startswith(agent_prefix):
+            key = name[len(agent_prefix):]
+        else:
+            continue
+        if key == 'DEFAULT' or key in credentials:
+            continue
+        app_secret = getattr(config, secret_prefix + key, None) or environ.get(secret_prefix + key)
+        agent_id = getattr(config, agent_prefix + key, None) or environ.get(agent_prefix + key)
+        if app_secret or agent_id:
+            credentials[key] = (app_secret, agent_id)
+    return credentials
+
+
+# WeCom per-model credentials, built once so adapters do a single dict lookup
+Config.WECOM_CREDENTIALS = _collect_wecom_credentials(Config)
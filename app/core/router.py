@@ -1,9 +1,13 @@
-from flask import Flask, Blueprint, request, jsonify
+from functools import lru_cache
+from flask import Flask, Blueprint, Response, request
 from app.core.source_processor import SourceProcessor
 
 # Main blueprint for API routes
 api_bp = Blueprint('api', __name__)
 
+# Fixed error body, serialized once; a fresh Response is still built per request
+_METHOD_NOT_ALLOWED = b'{"error":"Method not allowed"}'
+
 def register_routes(app: Flask):
     """Register all routes with the Flask application.
     
@@ -19,6 +23,21 @@ def register_routes(app: Flask):
     for rule in app.url_map.iter_rules():
         app.logger.debug(f"Route: {rule}")
 
+@lru_cache(maxsize=32)
+def get_processor(source: str) -> SourceProcessor:
+    """Return the shared processor for a source, creating it on first use
+    
+    Processors and their adapters hold no per-request state, so one per
+    source is reused instead of rebuilding the adapter on every request.
+    
+    Args:
+        source: The source of the request (wechat/wecom/etc.)
+        
+    Returns:
+        The source processor
+    """
+    return SourceProcessor(source)
+
 @api_bp.route('/<source>/<provider>', methods=['GET', 'POST'], defaults={'model': None})
 @api_bp.route('/<source>/<provider>/<model>', methods=['GET', 'POST'])
 def handle_request(source, provider, model):
@@ -32,10 +51,11 @@ def handle_request(source, provider, model):
     Returns:
         The appropriate response based on the request.
     """
-    # Initialize the source processor
-    processor = SourceProcessor(source)
+    # Get the shared source processor
+    processor = get_processor(source.lower())
     
     # Process the request based on the method (GET for verification, POST for messages)
+    # Verification only checks a signature, so answer it before any POST-side work
     if request.method == 'GET':
         return processor.verify(request)
     elif request.method == 'POST':
@@ -45,4 +65,4 @@ def handle_request(source, provider, model):
         # Process with the specified provider and model
         return processor.process(params, provider, model)
     else:
-        return jsonify({"error": "Method not allowed"}), 405 
\ No newline at end of file
+        return Response(_METHOD_NOT_ALLOWED, status=405, mimetype='application/json')
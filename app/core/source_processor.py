@@ -1,8 +1,10 @@
 from flask import Request, Response
 from typing import Dict, Any
-import importlib
 import logging
 
+from app.adapters.source_adapters import REGISTRY
+from app.services.provider_services import PROVIDERS
+
 logger = logging.getLogger(__name__)
 
 class SourceProcessor:
@@ -18,21 +20,17 @@ class SourceProcessor:
         self.adapter = self._load_adapter()
         
     def _load_adapter(self):
-        """Dynamically load the appropriate source adapter based on the source name
+        """Load the appropriate source adapter based on the source name
         
         Returns:
             An instance of the source adapter
         """
         try:
-            # Convert source name to proper class name format (e.g., 'wechat' -> 'WechatAdapter')
-            logger.info(f"load adapter for source {self.source}")
-            adapter_class_name = f"{self.source.capitalize()}Adapter"
-            module = importlib.import_module(f"app.adapters.source_adapters.{self.source}_adapter")
-            adapter_class = getattr(module, adapter_class_name)
-            return adapter_class()
-        except (ImportError, AttributeError) as e:
-            logger.error(f"Failed to load adapter for source {self.source}: {str(e)}")
+            adapter_cls = REGISTRY[self.source]
+        except KeyError:
+            logger.error(f"Failed to load adapter for source {self.source}")
             raise ValueError(f"Unsupported source type: {self.source}")
+        return adapter_cls()
     
     def verify(self, request: Request) -> Response:
         """Handle GET requests for source verification
@@ -90,12 +88,8 @@ class SourceProcessor:
             An instance of the provider handler
         """
         try:
-            provider_lower = provider.lower()
-            # Convert provider name to proper class name format (e.g., 'groq' -> 'GroqProvider')
-            provider_class_name = f"{provider_lower.capitalize()}Provider"
-            module = importlib.import_module(f"app.services.provider_services.{provider_lower}_service")
-            provider_class = getattr(module, provider_class_name)
-            return provider_class(model)
-        except (ImportError, AttributeError) as e:
-            logger.error(f"Failed to load provider handler for {provider}: {str(e)}")
-            raise ValueError(f"Unsupported provider: {provider}") 
\ No newline at end of file
+            provider_cls = PROVIDERS[provider.lower()]
+        except KeyError:
+            logger.error(f"Failed to load provider handler for {provider}")
+            raise ValueError(f"Unsupported provider: {provider}")
+        return provider_cls(model) 
\ No newline at end of file
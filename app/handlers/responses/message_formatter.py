@@ -9,6 +9,15 @@ logger = logging.getLogger(__name__)
 class MessageFormatter:
     """消息格式化处理工具类"""
     
+    # 根据不同来源定制的消息格式
+    _TEMPLATES = {
+        'wechat': "{p}/{m}:\n\n{c}",  # 微信公众号的消息格式
+        'wecom': "[{p}/{m}]\n{c}",     # 企业微信的消息格式
+    }
+    # 默认格式
+    _DEFAULT_TEMPLATE = "{p}/{m}: {c}"
+    _ERROR_TEMPLATE = "Error from {p}/{m}: {e}"
+    
     @staticmethod
     def format_ai_response(source: str, provider: str, model: str, content: str, 
                           error: Optional[str] = None) -> str:
@@ -25,18 +34,10 @@ class MessageFormatter:
             格式化后的消息文本
         """
         if error:
-            return f"Error from {provider}/{model}: {error}"
+            return MessageFormatter._ERROR_TEMPLATE.format(p=provider, m=model, e=error)
         
-        # 根据不同来源和提供商，可以定制不同的格式
-        if source == 'wechat':
-            # 微信公众号的消息格式
-            return f"{provider}/{model}:\n\n{content}"
-        elif source == 'wecom':
-            # 企业微信的消息格式
-            return f"[{provider}/{model}]\n{content}"
-        else:
-            # 默认格式
-            return f"{provider}/{model}: {content}"
+        template = MessageFormatter._TEMPLATES.get(source, MessageFormatter._DEFAULT_TEMPLATE)
+        return template.format(p=provider, m=model, c=content)
     
     @staticmethod
     def split_message(message: str, max_length: int = 2000) -> list:
@@ -44,30 +45,37 @@ class MessageFormatter:
         
         Args:
             message: 完整消息文本
-            max_length: 每个片段的最大长度
+            max_length: 每个片段的最大字节数
             
         Returns:
             消息片段列表
         """
-        if len(message) <= max_length:
+        if not message:
+            return []
+        # 纯 ASCII 文本字节数等于字符数，无需编码，直接按字符切片
+        if message.isascii():
+            return [message[i:i + max_length] for i in range(0, len(message), max_length)]
+        
+        # 整体编码一次，再按字节切片
+        data = message.encode('utf-8')
+        size = len(data)
+        if size <= max_length:
             return [message]
         
-        # 按字节长度分割消息
+        view = memoryview(data)
         chunks = []
-        current_chunk = ""
-        current_size = 0
-        
-        for char in message:
-            char_size = len(char.encode('utf-8'))
-            if current_size + char_size > max_length:
-                chunks.append(current_chunk)
-                current_chunk = ""
-                current_size = 0
-            
-            current_chunk += char
-            current_size += char_size
-        
-        if current_chunk:
-            chunks.append(current_chunk)
+        start = 0
+        while start < size:
+            end = min(start + max_length, size)
+            # 切点回退到 UTF-8 字符边界（0b10xxxxxx 为续字节）
+            while end < size and end > start and (data[end] & 0xC0) == 0x80:
+                end -= 1
+            if end == start:
+                # max_length 小于单个字符的字节数，整字符输出
+                end = start + 1
+                while end < size and (data[end] & 0xC0) == 0x80:
+                    end += 1
+            chunks.append(str(view[start:end], 'utf-8'))
+            start = end
         
-        return chunks 
\ No newline at end of file
+        return chunks
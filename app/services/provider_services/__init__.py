@@ -1 +1,15 @@
-# This file makes the provider_services directory a Python package
\ No newline at end of file
+# This file makes the provider_services directory a Python package
+from app.services.provider_services.deepseek_service import DeepseekProvider
+from app.services.provider_services.geekai_service import GeekaiProvider
+from app.services.provider_services.groq_service import GroqProvider
+from app.services.provider_services.tencent_service import TencentProvider
+from app.services.provider_services.tongyiqianwen_service import TongyiqianwenProvider
+
+# Provider name (lower-cased URL segment) -> provider class
+PROVIDERS = {
+    'deepseek': DeepseekProvider,
+    'geekai': GeekaiProvider,
+    'groq': GroqProvider,
+    'tencent': TencentProvider,
+    'tongyiqianwen': TongyiqianwenProvider,
+}
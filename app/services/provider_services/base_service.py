@@ -1,6 +1,217 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 import logging
+import random
+import re
+import threading
+import time
+
+import httpx
+from celery import current_task
+from celery.signals import worker_shutdown
+from openai import DefaultHttpxClient, OpenAI
+
+from app.adapters.source_adapters import get_adapter
+from app.config.config import Config
+from app.utils.celery_utils import celery
+from app.utils.llm_cache import get_cached_response, set_cached_response
+
+logger = logging.getLogger(__name__)
+
+# Process-wide API clients keyed by (api_key, base_url); each keeps its own
+# HTTP connection pool, so tasks reuse warm connections instead of
+# building a client and handshaking per request
+_client_lock = threading.Lock()
+_openai_clients: Dict[tuple, Any] = {}
+
+# A stalled connect or stream frees the worker instead of blocking it indefinitely
+LLM_TIMEOUT = httpx.Timeout(Config.LLM_READ_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT)
+# Room for every concurrent task in a worker to hold its own connection
+LLM_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# Everything up to and including the last sentence end in a buffer
+_SENTENCE_PREFIX = re.compile(r'.*[。！？；!?;\n]', re.S)
+
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None):
+    """Return the shared OpenAI-compatible client for an endpoint
+    
+    Args:
+        api_key: The API key
+        base_url: The API base URL, or None for the SDK default
+        
+    Returns:
+        The cached OpenAI client
+    """
+    key = (api_key, base_url)
+    client = _openai_clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                client = _openai_clients[key] = OpenAI(
+                    api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT,
+                    http_client=DefaultHttpxClient(limits=LLM_HTTP_LIMITS, http2=Config.LLM_HTTP2))
+    return client
+
+
+def retry_on_rate_limit(exc: Exception) -> None:
+    """Re-queue the running task with backoff if the provider rate-limited it
+    
+    Only HTTP 429 responses are retried, up to ``LLM_RATE_LIMIT_RETRIES``
+    times; otherwise this returns and the caller handles the error.
+    
+    Args:
+        exc: The exception raised by the provider call
+        
+    Raises:
+        celery.exceptions.Retry: When the task has been re-queued
+    """
+    if getattr(exc, 'status_code', None) != 429:
+        return
+    task = current_task
+    if task is None or task.request.retries >= Config.LLM_RATE_LIMIT_RETRIES:
+        return
+    # Exponential backoff with jitter, so throttled tasks do not retry in lockstep
+    countdown = min(2 ** (task.request.retries + 1), 30) + random.random()
+    logger.warning("Rate limited by provider, retrying in %.1fs", countdown)
+    # Pass the limit on, or retry() would stop at Celery's default of 3
+    task.retry(exc=exc, countdown=countdown, max_retries=Config.LLM_RATE_LIMIT_RETRIES)
+
+
+# Requests for written output get a larger token budget than plain chat
+_LONG_OUTPUT_HINTS = ('写', '生成', '翻译', '总结', '代码', '文章')
+
+
+def estimate_max_tokens(query: str, cap: int) -> int:
+    """Size the completion budget to the query instead of always asking for the cap
+    
+    Args:
+        query: The user's query
+        cap: The most the model may generate
+        
+    Returns:
+        The max_tokens to request, between LLM_MIN_MAX_TOKENS and ``cap``
+    """
+    per_char = 64 if any(hint in query for hint in _LONG_OUTPUT_HINTS) else 8
+    return min(cap, max(Config.LLM_MIN_MAX_TOKENS, per_char * len(query)))
+
+
+@worker_shutdown.connect
+def close_clients(**kwargs) -> None:
+    """Close the cached API clients when the Celery worker shuts down"""
+    with _client_lock:
+        clients = list(_openai_clients.values())
+        _openai_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning("Failed to close API client: %s", e)
+
+
+class StreamingReply:
+    """Forward a streamed completion to the user in pieces as it arrives
+    
+    Deltas are buffered and sent as one message at a sentence boundary,
+    either once ``flush_chars`` characters are pending or once
+    ``flush_seconds`` have passed since the last send, so the user sees the
+    start of a long answer without every token becoming its own message.
+    A full buffer with no sentence end is sent as is. Pieces go out through
+    the adapter's text-only send with their parts numbered continuously,
+    one after another in the calling task, which keeps them in order.
+    """
+    
+    def __init__(self, adapter: Any, user_id: str, model_tag: str,
+                 flush_chars: int = Config.STREAM_FLUSH_CHARS,
+                 flush_seconds: float = Config.STREAM_FLUSH_SECONDS):
+        """Initialize the reply
+        
+        Args:
+            adapter: The source adapter used to send each piece
+            user_id: The user to send to
+            model_tag: The model label shown in each message prefix
+            flush_chars: Number of buffered characters that triggers a send
+            flush_seconds: Seconds after which a complete sentence is sent early
+        """
+        self.adapter = adapter
+        self.user_id = user_id
+        self.model_tag = model_tag
+        self.flush_chars = flush_chars
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._pending_size = 0
+        self._sent = []
+        self._next_index = 1
+        self._deadline = time.monotonic() + flush_seconds
+    
+    def feed(self, text: str) -> None:
+        """Buffer a delta, sending complete sentences once the buffer is due"""
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.flush_chars:
+            self._flush_sentences(force=True)
+        elif time.monotonic() >= self._deadline:
+            self._flush_sentences(force=False)
+    
+    def _flush_sentences(self, force: bool) -> None:
+        """Send the buffer up to its last sentence end, keeping the rest
+        
+        Args:
+            force: Send the whole buffer when it contains no sentence end
+        """
+        pending = ''.join(self._pending)
+        match = _SENTENCE_PREFIX.match(pending)
+        if match is None:
+            if force:
+                self.flush()
+            return
+        rest = pending[match.end():]
+        self._pending = [rest] if rest else []
+        self._pending_size = len(rest)
+        self._send(match.group())
+    
+    def flush(self) -> None:
+        """Send whatever is buffered"""
+        if not self._pending:
+            return
+        piece = ''.join(self._pending)
+        self._pending.clear()
+        self._pending_size = 0
+        self._send(piece)
+    
+    def _send(self, piece: str) -> None:
+        self._sent.append(piece)
+        self._deadline = time.monotonic() + self.flush_seconds
+        # Text only, numbered on from the previous piece; the extras that
+        # send_message adds belong to a whole answer, not to each piece
+        self._next_index += self.adapter.send_text(self.user_id, piece, self.model_tag,
+                                                   self._next_index)
+    
+    def consume(self, stream: Any) -> str:
+        """Forward a whole stream and return the complete text
+        
+        Args:
+            stream: The streaming response from the API
+            
+        Returns:
+            The complete text from the stream
+        """
+        feed = self.feed
+        try:
+            for chunk in stream:
+                choices = chunk.choices
+                if not choices:
+                    continue
+                content = choices[0].delta.content
+                if content:
+                    feed(content)
+        finally:
+            # 确保连接归还连接池，即使中途出错
+            stream.close()
+        self.flush()
+        return ''.join(self._sent)
+
 
 class BaseProviderService(ABC):
     """Base class for all AI provider services"""
@@ -25,20 +236,132 @@ class BaseProviderService(ABC):
         """
         pass
     
+    def queue_cached_reply(self, params: Dict[str, Any], provider: str,
+                           adapter_model: str, model_tag: str) -> bool:
+        """Queue a send-only task for a query already in the response cache
+        
+        The send runs on a worker like any other reply, so the web request
+        returns at once, but it skips the provider queue and the LLM call.
+        
+        Args:
+            params: The request parameters
+            provider: The AI provider name, as used for the cache and adapter
+            adapter_model: The model name used to pick adapter credentials
+            model_tag: The model label shown in the message prefix
+            
+        Returns:
+            True if a cached answer was queued, False if the provider task is needed
+        """
+        content = get_cached_response(provider, self.model, params['content'])
+        if content is None:
+            return False
+        send_reply.delay(
+            user_id=params['from_user'],
+            content=content,
+            model_tag=model_tag,
+            source=params['source'],
+            provider=provider,
+            adapter_model=adapter_model
+        )
+        return True
+    
     @staticmethod
     def transfer_stream_to_text(stream: Any) -> str:
         """Transfer the stream to text
         
         Args:
-            response: The streaming response from the API
+            stream: The streaming response from the API
             
         Returns:
             The complete text from the stream
         """
         buffer = []
-        for chunk in stream:
-            content = chunk.choices[0].delta.content or ""
-            buffer.append(content)
+        append = buffer.append
+        try:
+            for chunk in stream:
+                # 用量统计等 chunk 没有 choices，跳过
+                choices = chunk.choices
+                if not choices:
+                    continue
+                content = choices[0].delta.content
+                if content:
+                    append(content)
+        finally:
+            # 确保连接归还连接池，即使中途出错
+            stream.close()
+
+        return ''.join(buffer) 
+
+
+def run_provider_request(provider: str, adapter_model: str, model_tag: str,
+                         user_id: str, query: str, model: str, source: str,
+                         generate: Callable[..., Optional[str]]) -> None:
+    """Run a provider task: cache lookup, provider call, retry and error notice
+    
+    Each provider task supplies only ``generate``, which makes the provider
+    call, sends the reply itself (whole or streamed) and returns the answer
+    to cache, or None when there is nothing to cache.
+    
+    Args:
+        provider: The AI provider name, used for the cache, adapter and errors
+        adapter_model: The model name used to pick adapter credentials
+        model_tag: The model label shown in the message prefix
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+        generate: Callable taking (adapter, user_id, query, model, model_tag)
+    """
+    # Resolve the adapter once; it is reused for the reply and any error notice
+    try:
+        adapter = get_adapter(source, provider, adapter_model)
+    except KeyError:
+        logger.error("Unknown source: %s", source)
+        return
+    
+    try:
+        # Answer identical queries from the cache
+        content = get_cached_response(provider, model, query)
+        if content is not None:
+            adapter.send_message(user_id, content, model_tag)
+            return
+        
+        content = generate(adapter, user_id, query, model, model_tag)
+        if content is not None:
+            set_cached_response(provider, model, query, content)
+        
+    except Exception as e:
+        # 被限流时稍后重试，而不是直接把错误发给用户
+        retry_on_rate_limit(e)
+        logger.error("Error processing %s request: %s", provider, e)
+        # Try to notify the user about the error
+        try:
+            adapter.send_message(user_id, f"Sorry, there was an error processing your request with {provider}: {e}")
+        except Exception:
+            logger.exception("Failed to send error notification to user")
 
-        full_content = ''.join([str(item) for item in buffer if item]) 
-        return full_content 
\ No newline at end of file
+
+@celery.task(name="provider_services.send_reply", ignore_result=True)
+def send_reply(user_id: str, content: str, model_tag: str, source: str,
+               provider: str, adapter_model: str):
+    """Celery task to send a ready answer, such as a cached one, to a user
+    
+    A failed send is logged and not retried, so parts already delivered
+    are never sent twice.
+    
+    Args:
+        user_id: The user ID
+        content: The answer to send
+        model_tag: The model label shown in the message prefix
+        source: The source of the request (wechat/wecom)
+        provider: The AI provider name, used to pick adapter credentials
+        adapter_model: The model name used to pick adapter credentials
+    """
+    try:
+        adapter = get_adapter(source, provider, adapter_model)
+    except KeyError:
+        logger.error("Unknown source: %s", source)
+        return
+    
+    if not adapter.send_message(user_id, content, model_tag):
+        logger.error("Failed to send %s reply to %s", provider, user_id)
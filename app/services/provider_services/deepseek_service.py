@@ -1,8 +1,9 @@
 import logging
-import httpx
 from typing import Dict, Any, Optional
 
-from app.services.provider_services.base_service import BaseProviderService
+from app.services.provider_services.base_service import (
+    BaseProviderService, get_openai_client, run_provider_request
+)
 from app.config.config import Config
 from app.utils.celery_utils import celery
 
@@ -42,7 +43,7 @@ class DeepseekProvider(BaseProviderService):
         
         # For better response times, process the request asynchronously
         # and return an immediate response
-        self._process_request_task.delay(
+        process_deepseek_request.delay(
             user_id=params['from_user'],
             query=params['content'],
             model=self.model,
@@ -55,67 +56,39 @@ class DeepseekProvider(BaseProviderService):
             'model': self.model,
             'async': True
         }
+
+
+def _generate(adapter: Any, user_id: str, query: str, model: str, model_tag: str) -> str:
+    """Ask DeepSeek, send the answer to the user and return it for the cache"""
+    # Reuse the process-wide client and its connection pool
+    client = get_openai_client(Config.DEEPSEEK_API_KEY, Config.DEEPSEEK_API_BASE)
     
-    @celery.task(name="deepseek_service.process_request")
-    def _process_request_task(user_id: str, query: str, model: str, source: str):
-        """Celery task to process a request with DeepSeek
-        
-        Args:
-            user_id: The user ID
-            query: The user's query
-            model: The model to use
-            source: The source of the request (wechat/wecom)
-        """
-        try:
-            from openai import OpenAI
-            
-            # Initialize DeepSeek client
-            client = OpenAI(
-                api_key=Config.DEEPSEEK_API_KEY,
-                base_url=Config.DEEPSEEK_API_BASE
-            )
-            
-            # Make the API call
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": query}
-                ],
-                temperature=1.0,
-                max_tokens=8192,
-                stream=False
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Send the response back to the user
-            # Dynamically import the appropriate adapter
-            if source == 'wechat':
-                from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                adapter = WechatAdapter()
-            elif source == 'wecom':
-                from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                adapter = WecomAdapter(provider="DeepSeek", model="DS-V3")
-            else:
-                logger.error(f"Unknown source: {source}")
-                return
-            
-            # Send the message
-            adapter.send_message(user_id, content, f"DeepSeek/{model}")
-            
-        except Exception as e:
-            logger.error(f"Error processing DeepSeek request: {str(e)}")
-            # Try to notify the user about the error
-            try:
-                if source == 'wechat':
-                    from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                    adapter = WechatAdapter()
-                elif source == 'wecom':
-                    from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                    adapter = WecomAdapter(provider="DeepSeek", model="DS-V3")
-                else:
-                    return
-                
-                adapter.send_message(user_id, f"Sorry, there was an error processing your request with DeepSeek: {str(e)}")
-            except:
-                logger.error("Failed to send error notification to user") 
\ No newline at end of file
+    # Make the API call
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        temperature=1.0,
+        max_tokens=8192,
+        stream=False
+    )
+    
+    content = response.choices[0].message.content
+    # Send the response back to the user
+    adapter.send_message(user_id, content, model_tag)
+    return content
+
+
+@celery.task(name="deepseek_service.process_request", ignore_result=True)
+def process_deepseek_request(user_id: str, query: str, model: str, source: str):
+    """Celery task to process a request with DeepSeek
+    
+    Args:
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+    """
+    run_provider_request("DeepSeek", "DS-V3", f"DeepSeek/{model}",
+                         user_id, query, model, source, _generate)
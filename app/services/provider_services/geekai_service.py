@@ -1,13 +1,16 @@
 import logging
-import httpx
 from typing import Dict, Any, Optional
 
-from app.services.provider_services.base_service import BaseProviderService
+from app.services.provider_services.base_service import (
+    BaseProviderService, StreamingReply, estimate_max_tokens, get_openai_client, run_provider_request
+)
 from app.config.config import Config
 from app.utils.celery_utils import celery
 
 logger = logging.getLogger(__name__)
 
+STREAM_TO_USER = Config.STREAM_TO_USER
+
 class GeekaiProvider(BaseProviderService):
     """Service for handling Geekai AI API requests"""
     
@@ -42,7 +45,7 @@ class GeekaiProvider(BaseProviderService):
         
         # For better response times, process the request asynchronously
         # and return an immediate response
-        self._process_request_task.delay(
+        process_geekai_request.delay(
             user_id=params['from_user'],
             query=params['content'],
             model=self.model,
@@ -55,67 +58,44 @@ class GeekaiProvider(BaseProviderService):
             'model': self.model,
             'async': True
         }
+
+
+def _generate(adapter: Any, user_id: str, query: str, model: str, model_tag: str) -> str:
+    """Ask Geekai, send the answer to the user and return it for the cache"""
+    # Reuse the process-wide client and its connection pool
+    client = get_openai_client(Config.GEEK_API_KEY_2, Config.GEEK_API_BASE)
     
-    @celery.task(name="Geekai_service.process   _request")
-    def _process_request_task(user_id: str, query: str, model: str, source: str):
-        """Celery task to process a request with Geekai
-        
-        Args:
-            user_id: The user ID
-            query: The user's query
-            model: The model to use
-            source: The source of the request (wechat/wecom)
-        """
-        try:
-            from openai import OpenAI
-            
-            # Initialize Q client
-            client = OpenAI(
-                api_key=Config.GEEK_API_KEY_2,
-                base_url=Config.GEEK_API_BASE
-            )
-            
-            # Make the API call
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.7,
-                max_tokens=136000,
-                stream=True
-            )
-            
-            content = BaseProviderService.transfer_stream_to_text(response) 
-            
-            # Send the response back to the user
-            # Dynamically import the appropriate adapter
-            if source == 'wechat':
-                from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                adapter = WechatAdapter()
-            elif source == 'wecom':
-                from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                adapter = WecomAdapter(provider="Geekai", model=model)
-            else:
-                logger.error(f"Unknown source: {source}")
-                return
-            
-            # Send the message
-            adapter.send_message(user_id, content, f"极客智坊/{model}")
-            
-        except Exception as e:
-            logger.error(f"Error processing Geekai request: {str(e)}")
-            # Try to notify the user about the error
-            try:
-                if source == 'wechat':
-                    from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                    adapter = WechatAdapter()
-                elif source == 'wecom':
-                    from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                    adapter = WecomAdapter(provider="Geekai", model=model)
-                else:
-                    return
-                
-                adapter.send_message(user_id, f"Sorry, there was an error processing your request with Geekai: {str(e)}")
-            except:
-                logger.error("Failed to send error notification to user") 
\ No newline at end of file
+    # Make the API call
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        temperature=0.7,
+        max_tokens=estimate_max_tokens(query, 136000),
+        # Stream only when forwarding pieces; otherwise one response body is cheaper
+        stream=STREAM_TO_USER
+    )
+    
+    if STREAM_TO_USER:
+        # Send the answer in pieces as it arrives
+        return StreamingReply(adapter, user_id, model_tag).consume(response)
+    
+    content = response.choices[0].message.content
+    # Send the response back to the user
+    adapter.send_message(user_id, content, model_tag)
+    return content
+
+
+@celery.task(name="geekai_service.process_request", ignore_result=True)
+def process_geekai_request(user_id: str, query: str, model: str, source: str):
+    """Celery task to process a request with Geekai
+    
+    Args:
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+    """
+    run_provider_request("Geekai", model, f"极客智坊/{model}",
+                         user_id, query, model, source, _generate)
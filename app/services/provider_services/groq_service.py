@@ -1,13 +1,55 @@
 import logging
+import threading
 import httpx
 from typing import Dict, Any, Optional
+from celery.signals import worker_shutdown
+from groq import Groq
 
-from app.services.provider_services.base_service import BaseProviderService
+from app.services.provider_services.base_service import (
+    BaseProviderService, StreamingReply, LLM_HTTP_LIMITS, LLM_TIMEOUT, run_provider_request
+)
 from app.config.config import Config
 from app.utils.celery_utils import celery
 
 logger = logging.getLogger(__name__)
 
+STREAM_TO_USER = Config.STREAM_TO_USER
+
+# Process-wide Groq client (and proxy transport), created on first use
+_client_lock = threading.Lock()
+_groq_client = None
+
+
+def _get_client():
+    """Return the shared Groq client, creating it on first use"""
+    global _groq_client
+    if _groq_client is None:
+        with _client_lock:
+            if _groq_client is None:
+                # One pooled transport (through the proxy if needed) for all tasks
+                transport = None
+                if Config.HTTP_PROXY:
+                    transport = httpx.HTTPTransport(proxy=Config.HTTP_PROXY, limits=LLM_HTTP_LIMITS,
+                                                   http2=Config.LLM_HTTP2)
+                http_client = httpx.Client(transport=transport, limits=LLM_HTTP_LIMITS,
+                                           http2=Config.LLM_HTTP2, timeout=LLM_TIMEOUT,
+                                           follow_redirects=True)
+                
+                _groq_client = Groq(api_key=Config.GROQ_API_KEY, http_client=http_client,
+                                    timeout=LLM_TIMEOUT)
+    return _groq_client
+
+
+@worker_shutdown.connect
+def _close_client(**kwargs) -> None:
+    """Close the shared Groq client and its transport when the worker shuts down"""
+    global _groq_client
+    with _client_lock:
+        client, _groq_client = _groq_client, None
+    if client is not None:
+        client.close()
+
+
 class GroqProvider(BaseProviderService):
     """Service for handling Groq AI API requests"""
     
@@ -42,7 +84,7 @@ class GroqProvider(BaseProviderService):
         
         # For better response times, process the request asynchronously
         # and return an immediate response
-        self._process_request_task.delay(
+        process_groq_request.delay(
             user_id=params['from_user'],
             query=params['content'],
             model=self.model,
@@ -55,73 +97,45 @@ class GroqProvider(BaseProviderService):
             'model': self.model,
             'async': True
         }
+
+
+def _generate(adapter: Any, user_id: str, query: str, model: str, model_tag: str) -> str:
+    """Ask Groq, send the answer to the user and return it for the cache"""
+    # Reuse the process-wide client and its connection pool
+    groq_client = _get_client()
     
-    @celery.task(name="groq_service.process_request")
-    def _process_request_task(user_id: str, query: str, model: str, source: str):
-        """Celery task to process a request with Groq
-        
-        Args:
-            user_id: The user ID
-            query: The user's query
-            model: The model to use
-            source: The source of the request (wechat/wecom)
-        """
-        try:
-            from groq import Groq
-            
-            # Configure proxy if needed
-            http_transport = None
-            if Config.HTTP_PROXY:
-                http_transport = httpx.HTTPTransport(proxy=Config.HTTP_PROXY)
-            
-            # Initialize Groq client
-            groq_client = Groq(
-                api_key=Config.GROQ_API_KEY,
-                http_client=httpx.Client(transport=http_transport) if http_transport else None
-            )
-            
-            # Make the API call
-            response = groq_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.6,
-                max_tokens=6000,
-                top_p=0.95,
-                stream=True
-            )
-            
-            full_content = BaseProviderService.transfer_stream_to_text(response) 
-            
-            # Send the response back to the user
-            # Dynamically import the appropriate adapter
-            if source == 'wechat':
-                from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                adapter = WechatAdapter()
-            elif source == 'wecom':
-                from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                adapter = WecomAdapter(provider="Groq", model="deepseek-r1-distill-llama-70b")
-            else:
-                logger.error(f"Unknown source: {source}")
-                return
-            
-            # Send the message
-            adapter.send_message(user_id, full_content, f"Groq/{model}")
-            
-        except Exception as e:
-            logger.error(f"Error processing Groq request: {str(e)}")
-            # Try to notify the user about the error
-            try:
-                if source == 'wechat':
-                    from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                    adapter = WechatAdapter()
-                elif source == 'wecom':
-                    from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                    adapter = WecomAdapter(provider="Groq", model="deepseek-r1-distill-llama-70b")
-                else:
-                    return
-                
-                adapter.send_message(user_id, f"Sorry, there was an error processing your request with Groq: {str(e)}")
-            except:
-                logger.error("Failed to send error notification to user") 
\ No newline at end of file
+    # Make the API call
+    response = groq_client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        temperature=0.6,
+        max_tokens=6000,
+        top_p=0.95,
+        # Stream only when forwarding pieces; otherwise one response body is cheaper
+        stream=STREAM_TO_USER
+    )
+    
+    if STREAM_TO_USER:
+        # Send the answer in pieces as it arrives
+        return StreamingReply(adapter, user_id, model_tag).consume(response)
+    
+    full_content = response.choices[0].message.content
+    # Send the response back to the user
+    adapter.send_message(user_id, full_content, model_tag)
+    return full_content
+
+
+@celery.task(name="groq_service.process_request", ignore_result=True)
+def process_groq_request(user_id: str, query: str, model: str, source: str):
+    """Celery task to process a request with Groq
+    
+    Args:
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+    """
+    run_provider_request("Groq", "deepseek-r1-distill-llama-70b", f"Groq/{model}",
+                         user_id, query, model, source, _generate)
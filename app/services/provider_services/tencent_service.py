@@ -1,15 +1,26 @@
 import logging
-import json
-import httpx
+from functools import partial
 from typing import Dict, Any, Optional
 
-from app.services.provider_services.base_service import BaseProviderService
+from app.services.provider_services.base_service import (
+    BaseProviderService, StreamingReply, estimate_max_tokens, get_openai_client, run_provider_request
+)
 from app.config.config import Config
 from app.utils.celery_utils import celery
-from openai import OpenAI
+from app.utils.llm_session import is_superseded, start_session
 
 logger = logging.getLogger(__name__)
 
+STREAM_TO_USER = Config.STREAM_TO_USER
+CANCEL_CHECK_CHUNKS = Config.LLM_CANCEL_CHECK_CHUNKS
+# Sent in place of the rest of an answer abandoned for a newer message
+_SUPERSEDED_NOTICE = "（收到新消息，本次回答已停止）"
+
+
+def _skip(text: str) -> None:
+    """Stand-in for StreamingReply.feed when answers are sent in one piece"""
+
+
 class TencentProvider(BaseProviderService):
     """Service for handling Tencent AI API requests"""
     
@@ -33,6 +44,10 @@ class TencentProvider(BaseProviderService):
         Returns:
             Dictionary containing the result and metadata
         """
+        # Every incoming message supersedes the user's earlier stream, whether
+        # or not it is answered from the cache
+        session = start_session(params['source'], params['from_user'])
+        
         if 'content' not in params:
             # For non-text messages or other unsupported types
             return {
@@ -42,14 +57,16 @@ class TencentProvider(BaseProviderService):
                 'async': False
             }
         
-        # For better response times, process the request asynchronously
-        # and return an immediate response
-        self._process_request_task.delay(
-            user_id=params['from_user'],
-            query=params['content'],
-            model=self.model,
-            source=params['source']
-        )
+        # Queries answered before get a send-only task with the cached answer; otherwise
+        # process the request asynchronously and return an immediate response
+        if not self.queue_cached_reply(params, "Tencent", "DS－R1－671B", f'Tencent/{self.model}'):
+            process_tencent_request.delay(
+                user_id=params['from_user'],
+                query=params['content'],
+                model=self.model,
+                source=params['source'],
+                session=session
+            )
         
         return {
             #'content': 'Your request is being processed...',
@@ -57,103 +74,124 @@ class TencentProvider(BaseProviderService):
             'model': self.model,
             'async': True
         }
+
+
+def _generate(adapter: Any, user_id: str, query: str, model: str, model_tag: str,
+              source: str, session: Optional[int]) -> Optional[str]:
+    """Ask Tencent, send the answer to the user and return it for the cache
     
-    @celery.task(name="tencent_service.process_request")
-    def _process_request_task(user_id: str, query: str, model: str, source: str):
-        """Celery task to process a request with Tencent
-        
-        Args:
-            user_id: The user ID
-            query: The user's query
-            model: The model to use
-            source: The source of the request (wechat/wecom)
-        """
-        try:
-            # Implement Tencent API client
-            # This is a simplified version - you would need to implement
-            # the actual API client for Tencent's services
-
-            client = OpenAI(
-                api_key=Config.TENCENT_API_KEY,
-                base_url=Config.TENCENT_API_BASE
-            )
+    Once the user has sent a newer message the stream is abandoned: anything
+    already buffered is sent with a short notice, and None is returned so
+    the partial answer is not cached.
+    """
+    # Reuse the process-wide client and its connection pool
+    client = get_openai_client(Config.TENCENT_API_KEY, Config.TENCENT_API_BASE)
 
-            reasoning_content = ""  # 定义完整思考过程
-            answer_content = ""     # 定义完整回复
-            is_answering = False   # 判断是否结束思考过程并开始回复
-            token_usage = 0 # 定义一次回答的token使用情况
-
-            # 创建聊天完成请求
-            stream = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.7,
-                max_tokens=64000,
-                stream=True
-            )
+    reasoning_parts = []  # 定义完整思考过程（分段收集，最后一次性拼接）
+    answer_parts = []     # 定义完整回复
+    is_answering = False   # 判断是否结束思考过程并开始回复
+    token_usage = 0 # 定义一次回答的token使用情况
 
-            reasoning_content += "<think>\n"
+    # 创建聊天完成请求
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        temperature=0.7,
+        max_tokens=estimate_max_tokens(query, 64000),
+        stream=True,
+        # 让服务端在最后一个chunk中返回用量
+        stream_options={"include_usage": True}
+    )
 
-            for chunk in stream:
-                # 去最后一个chunk来处理usage信息
-                if hasattr(chunk, 'usage') and chunk.usage:
-                    if hasattr(chunk.usage, 'total_tokens'):
-                        token_usage = chunk.usage.total_tokens
+    # 开启 STREAM_TO_USER 时，按到达顺序把思考过程和回复分段转发给用户
+    reply = StreamingReply(adapter, user_id, model_tag) if STREAM_TO_USER else None
+    forward = reply.feed if reply is not None else _skip
 
-                # 如果chunk没有choices，则跳过
-                if not getattr(chunk, 'choices', None): 
-                    continue
+    reasoning_parts.append("<think>\n")
+    forward("<think>\n")
 
-                delta = chunk.choices[0].delta
+    # 每隔若干个 chunk 检查用户是否已发来新消息，是则放弃本次回答
+    check_every = CANCEL_CHECK_CHUNKS if session is not None else 0
+    cancelled = False
 
-                # 处理空内容情况：即如果delta没有reasoning_content和content，则跳过
-                if not getattr(delta, 'reasoning_content', None) and not getattr(delta, 'content', None): 
-                    continue
+    try:
+        for index, chunk in enumerate(stream, 1):
+            if check_every and index % check_every == 0 and is_superseded(source, user_id, session):
+                cancelled = True
+                break
 
-                # 处理开始回答的情况
-                if not getattr(delta, 'reasoning_content', None) and not is_answering:
-                    reasoning_content += "</think>"
+            # 用量信息在最后一个chunk中（include_usage），该chunk没有choices
+            usage = chunk.usage
+            if usage is not None:
+                token_usage = usage.total_tokens
+
+            # 如果chunk没有choices，则跳过
+            choices = chunk.choices
+            if not choices: 
+                continue
+
+            # 每个 chunk 只读取一次字段，后续分支都用局部变量
+            delta = choices[0].delta
+            reasoning = getattr(delta, 'reasoning_content', None)
+            content = getattr(delta, 'content', None)
+
+            # 处理思考过程
+            if reasoning:
+                reasoning_parts.append(reasoning)
+                forward(reasoning)
+            # 处理回复内容；第一次收到回复时先结束思考过程
+            elif content:
+                if not is_answering:
+                    reasoning_parts.append("</think>")
+                    forward("</think>")
                     is_answering = True
+                answer_parts.append(content)
+                forward(content)
+    finally:
+        # 确保连接归还连接池，即使中途出错；提前退出时也会关闭上游连接
+        stream.close()
+    
+    if cancelled:
+        logger.info("Abandoned Tencent stream for %s after a newer message", user_id)
+        if reply is not None:
+            # 已分段发出部分内容：补全思考过程的结束标记，连同已缓冲的内容和提示一起发出
+            if not is_answering:
+                forward("</think>")
+            forward("\n" + _SUPERSEDED_NOTICE)
+            reply.flush()
+        else:
+            adapter.send_message(user_id, _SUPERSEDED_NOTICE, model_tag)
+        return None
 
-                # 处理思考过程
-                if getattr(delta, 'reasoning_content', None):
-                    reasoning_content += delta.reasoning_content
-                # 处理回复内容
-                elif getattr(delta, 'content', None):
-                    answer_content += delta.content
-            
-            full_content = "Token_usage: " + str(token_usage) + "\n" + reasoning_content + answer_content
-            
-            # Send the response back to the user
-            # Dynamically import the appropriate adapter
-            if source == 'wechat':
-                from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                adapter = WechatAdapter()
-            elif source == 'wecom':
-                from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                adapter = WecomAdapter(provider="Tencent", model="DS－R1－671B")
-            else:
-                logger.error(f"Unknown source: {source}")
-                return
-            
-            # Send the message
-            adapter.send_message(user_id, full_content, f"Tencent/{model}")
-            
-        except Exception as e:
-            logger.error(f"Error processing Tencent request: {str(e)}")
-            # Try to notify the user about the error
-            try:
-                if source == 'wechat':
-                    from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                    adapter = WechatAdapter()
-                elif source == 'wecom':
-                    from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                    adapter = WecomAdapter(provider="Tencent", model="DS－R1－671B")
-                else:
-                    return
-                
-                adapter.send_message(user_id, f"Sorry, there was an error processing your request with Tencent: {str(e)}")
-            except:
-                logger.error("Failed to send error notification to user") 
\ No newline at end of file
+    # 缓存只保存思考过程和回复；用量属于本次请求，只在新生成的回答里发给用户
+    full_content = "".join((*reasoning_parts, *answer_parts))
+    
+    if reply is not None:
+        # 已边生成边发送，最后补上用量
+        forward("\nToken_usage: " + str(token_usage))
+        reply.flush()
+    else:
+        # Send the response back to the user
+        adapter.send_message(user_id, "".join(("Token_usage: ", str(token_usage), "\n", full_content)),
+                             model_tag)
+    return full_content
+
+
+@celery.task(name="tencent_service.process_request", ignore_result=True)
+def process_tencent_request(user_id: str, query: str, model: str, source: str,
+                            session: Optional[int] = None):
+    """Celery task to process a request with Tencent
+    
+    Args:
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+        session: The user's session number when queued; the stream is
+            abandoned once the user sends a newer message
+    """
+    run_provider_request("Tencent", "DS－R1－671B", f"Tencent/{model}",
+                         user_id, query, model, source,
+                         partial(_generate, source=source, session=session))
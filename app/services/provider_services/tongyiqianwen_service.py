@@ -1,8 +1,9 @@
 import logging
-import httpx
 from typing import Dict, Any, Optional
 
-from app.services.provider_services.base_service import BaseProviderService
+from app.services.provider_services.base_service import (
+    BaseProviderService, estimate_max_tokens, get_openai_client, run_provider_request
+)
 from app.config.config import Config
 from app.utils.celery_utils import celery
 
@@ -40,14 +41,15 @@ class TongyiqianwenProvider(BaseProviderService):
                 'async': False
             }
         
-        # For better response times, process the request asynchronously
-        # and return an immediate response
-        self._process_request_task.delay(
-            user_id=params['from_user'],
-            query=params['content'],
-            model=self.model,
-            source=params['source']
-        )
+        # Queries answered before get a send-only task with the cached answer; otherwise
+        # process the request asynchronously and return an immediate response
+        if not self.queue_cached_reply(params, "Tongyiqianwen", "QWQ-Plus", f'通义千问/{self.model}'):
+            process_tongyiqianwen_request.delay(
+                user_id=params['from_user'],
+                query=params['content'],
+                model=self.model,
+                source=params['source']
+            )
         
         return {
             #'content': 'Your request is being processed...',
@@ -55,67 +57,39 @@ class TongyiqianwenProvider(BaseProviderService):
             'model': self.model,
             'async': True
         }
+
+
+def _generate(adapter: Any, user_id: str, query: str, model: str, model_tag: str) -> str:
+    """Ask Tongyiqianwen, send the answer to the user and return it for the cache"""
+    # Reuse the process-wide client and its warm connection pool
+    client = get_openai_client(Config.GEEK_API_KEY_2, Config.GEEK_API_BASE)
     
-    @celery.task(name="Tongyiqianwen_service.process_request")
-    def _process_request_task(user_id: str, query: str, model: str, source: str):
-        """Celery task to process a request with Tongyiqianwen
-        
-        Args:
-            user_id: The user ID
-            query: The user's query
-            model: The model to use
-            source: The source of the request (wechat/wecom)
-        """
-        try:
-            from openai import OpenAI
-            
-            # Initialize Q client
-            client = OpenAI(
-                api_key=Config.GEEK_API_KEY_2,
-                base_url=Config.GEEK_API_BASE
-            )
-            
-            # Make the API call
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.7,
-                max_tokens=139000,
-                stream=True
-            )
-            
-            content = BaseProviderService.transfer_stream_to_text(response) 
-            
-            # Send the response back to the user
-            # Dynamically import the appropriate adapter
-            if source == 'wechat':
-                from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                adapter = WechatAdapter()
-            elif source == 'wecom':
-                from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                adapter = WecomAdapter(provider="Tongyiqianwen", model="QWQ-Plus")
-            else:
-                logger.error(f"Unknown source: {source}")
-                return
-            
-            # Send the message
-            adapter.send_message(user_id, content, f"通义千问/{model}")
-            
-        except Exception as e:
-            logger.error(f"Error processing Tongyiqianwen request: {str(e)}")
-            # Try to notify the user about the error
-            try:
-                if source == 'wechat':
-                    from app.adapters.source_adapters.wechat_adapter import WechatAdapter
-                    adapter = WechatAdapter()
-                elif source == 'wecom':
-                    from app.adapters.source_adapters.wecom_adapter import WecomAdapter
-                    adapter = WecomAdapter(provider="Tongyiqianwen", model="QWQ-Plus")
-                else:
-                    return
-                
-                adapter.send_message(user_id, f"Sorry, there was an error processing your request with Tongyiqianwen: {str(e)}")
-            except:
-                logger.error("Failed to send error notification to user") 
\ No newline at end of file
+    # Make the API call
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        temperature=0.7,
+        max_tokens=estimate_max_tokens(query, 139000),
+        stream=True
+    )
+    
+    content = BaseProviderService.transfer_stream_to_text(response)
+    # Send the response back to the user
+    adapter.send_message(user_id, content, model_tag)
+    return content
+
+
+@celery.task(name="tongyiqianwen_service.process_request", ignore_result=True)
+def process_tongyiqianwen_request(user_id: str, query: str, model: str, source: str):
+    """Celery task to process a request with Tongyiqianwen
+    
+    Args:
+        user_id: The user ID
+        query: The user's query
+        model: The model to use
+        source: The source of the request (wechat/wecom)
+    """
+    run_provider_request("Tongyiqianwen", "QWQ-Plus", f"通义千问/{model}",
+                         user_id, query, model, source, _generate)
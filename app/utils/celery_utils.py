@@ -1,14 +1,26 @@
+import orjson
 from celery import Celery
 from flask import Flask
+from kombu import Exchange, Queue
+from kombu.serialization import register
 
 # Global Celery instance to be used throughout the application
 celery = Celery('wechat_robot')
 
+# JSON on the wire, encoded and decoded by orjson instead of the stdlib
+register('orjson', orjson.dumps, orjson.loads,
+         content_type='application/x-orjson', content_encoding='utf-8')
+
 def init_celery(app: Flask):
     """Initialize Celery with Flask app configuration
     
     This should be called once during application startup.
     """
+    durable = not app.config['CELERY_TRANSIENT_QUEUES']
+    # Only the prefork pool has child processes to recycle; leave the limits
+    # unset for other pools, which ignore them
+    prefork = app.config['CELERY_WORKER_POOL'] == 'prefork'
+    
     celery.conf.update(
         broker_url=app.config['CELERY_BROKER_URL'],
         result_backend=app.config['CELERY_RESULT_BACKEND'],
@@ -16,20 +28,47 @@ def init_celery(app: Flask):
         accept_content=app.config['CELERY_ACCEPT_CONTENT'],
         result_serializer=app.config['CELERY_RESULT_SERIALIZER'],
         timezone=app.config['CELERY_TIMEZONE'],
-        enable_utc=app.config['CELERY_ENABLE_UTC']
+        enable_utc=app.config['CELERY_ENABLE_UTC'],
+        task_compression=app.config['CELERY_TASK_COMPRESSION'],
+        # Read by every worker however it is launched, including
+        # `celery -A celery_worker.celery worker`
+        worker_pool=app.config['CELERY_WORKER_POOL'],
+        worker_concurrency=app.config['CELERY_WORKER_CONCURRENCY'],
+        worker_max_tasks_per_child=app.config['CELERY_WORKER_MAX_TASKS_PER_CHILD'] if prefork else None,
+        worker_max_memory_per_child=app.config['CELERY_WORKER_MAX_MEMORY_PER_CHILD'] if prefork else None,
+        # Replies go out through the adapters; nothing reads task results
+        task_ignore_result=True,
+        broker_pool_limit=app.config['CELERY_BROKER_POOL_LIMIT'],
+        broker_connection_timeout=app.config['CELERY_BROKER_CONNECTION_TIMEOUT'],
+        broker_connection_retry_on_startup=True,
+        # Keep idle pooled broker/backend connections alive through NATs and proxies
+        broker_transport_options={'visibility_timeout': 3600, 'socket_keepalive': True},
+        redis_socket_keepalive=True,
+        task_queues=[
+            Queue(queue, Exchange(queue, durable=durable), routing_key=queue, durable=durable)
+            for queue in ['celery', *app.config['CELERY_PROVIDER_QUEUES']]
+        ],
+        task_default_delivery_mode='persistent' if durable else 'transient',
+        task_routes={
+            f'{queue}_service.process_request': {'queue': queue}
+            for queue in app.config['CELERY_PROVIDER_QUEUES']
+        },
+        # Pace each provider's LLM calls to stay under its API rate limit
+        task_annotations={
+            f'{provider}_service.process_request': {'rate_limit': rate_limit}
+            for provider, rate_limit in app.config['PROVIDER_RATE_LIMITS'].items()
+            if rate_limit
+        }
     )
     
-    # Register task modules - corrected paths to match actual project structure
-    celery.autodiscover_tasks([
-        'app.adapters.source_adapters.wechat_adapter',
-        'app.adapters.source_adapters.wecom_adapter',
-        'app.services.provider_services.groq_service',
-        'app.services.provider_services.tongyiqianwen_service',
-        'app.services.provider_services.deepseek_service',
-        'app.services.provider_services.tencent_service',
+    # Task modules, imported once when the worker starts
+    celery.conf.imports = (
         'app.services.provider_services.deepseek_service',
         'app.services.provider_services.geekai_service',
-    ], force=True)
+        'app.services.provider_services.groq_service',
+        'app.services.provider_services.tencent_service',
+        'app.services.provider_services.tongyiqianwen_service',
+    )
     
     # Apply Flask app context to Celery tasks
     TaskBase = celery.Task
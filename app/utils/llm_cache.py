@@ -0,0 +1,60 @@
+import hashlib
+import logging
+from typing import Optional
+
+from app.config.config import Config
+from app.utils.redis_utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = 'llm_cache:'
+_TTL = Config.LLM_CACHE_TTL
+
+
+def _cache_key(provider: str, model: str, query: str) -> str:
+    """Build the exact-match key for a provider/model/query triple"""
+    digest = hashlib.sha256(f"{provider}\0{model}\0{query}".encode('utf-8')).hexdigest()
+    return _KEY_PREFIX + digest
+
+
+def get_cached_response(provider: str, model: str, query: str) -> Optional[str]:
+    """Look up a previous answer to the exact same query
+    
+    Args:
+        provider: The AI provider name
+        model: The model name
+        query: The user's query
+        
+    Returns:
+        The cached answer, or None on a miss or when caching is disabled
+    """
+    redis = get_redis()
+    if redis is None or _TTL <= 0:
+        return None
+    try:
+        cached = redis.get(_cache_key(provider, model, query))
+    except Exception as e:
+        logger.warning("LLM cache lookup failed: %s", e)
+        return None
+    if cached is None:
+        return None
+    logger.info("LLM cache hit for %s/%s", provider, model)
+    return cached.decode('utf-8')
+
+
+def set_cached_response(provider: str, model: str, query: str, content: str) -> None:
+    """Store an answer for later identical queries
+    
+    Args:
+        provider: The AI provider name
+        model: The model name
+        query: The user's query
+        content: The answer to cache
+    """
+    redis = get_redis()
+    if redis is None or _TTL <= 0 or not content:
+        return
+    try:
+        redis.setex(_cache_key(provider, model, query), _TTL, content.encode('utf-8'))
+    except Exception as e:
+        logger.warning("LLM cache store failed: %s", e)
@@ -0,0 +1,66 @@
+import logging
+from typing import Optional
+
+from app.config.config import Config
+from app.utils.redis_utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = 'llm_session:'
+# Long enough to outlive any stream; the key only needs to exist while one runs
+_TTL = 3600
+
+
+def _session_key(source: str, user_id: str) -> str:
+    return f"{_KEY_PREFIX}{source}:{user_id}"
+
+
+def start_session(source: str, user_id: str) -> Optional[int]:
+    """Mark a new request as the user's current one
+    
+    Any stream still running for an earlier request from the same user
+    sees the newer session and stops at its next check.
+    
+    Args:
+        source: The source of the request (wechat/wecom)
+        user_id: The user ID
+    
+    Returns:
+        The new session number, or None when Redis or cancelling is unavailable
+    """
+    redis = get_redis()
+    if redis is None or Config.LLM_CANCEL_CHECK_CHUNKS <= 0:
+        return None
+    key = _session_key(source, user_id)
+    try:
+        pipe = redis.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, _TTL)
+        return pipe.execute()[0]
+    except Exception as e:
+        logger.warning("Failed to start LLM session: %s", e)
+        return None
+
+
+def is_superseded(source: str, user_id: str, session: Optional[int]) -> bool:
+    """Check whether the user has sent a newer request since ``session`` started
+    
+    Args:
+        source: The source of the request (wechat/wecom)
+        user_id: The user ID
+        session: The number returned by start_session, or None
+    
+    Returns:
+        True if a newer request exists and this one can be abandoned
+    """
+    if session is None:
+        return False
+    redis = get_redis()
+    if redis is None:
+        return False
+    try:
+        current = redis.get(_session_key(source, user_id))
+    except Exception as e:
+        logger.warning("LLM session check failed: %s", e)
+        return False
+    return current is not None and int(current) != session
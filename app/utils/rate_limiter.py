@@ -0,0 +1,39 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket limiter used to pace outbound API calls
+
+    Unlike a fixed ``time.sleep`` between calls, the bucket only blocks when
+    calls arrive faster than ``rate``, so time spent waiting on the network
+    counts towards the interval and nothing sleeps after the last call.
+    """
+    
+    def __init__(self, rate: float, capacity: int = 1):
+        """Initialize the limiter
+        
+        Args:
+            rate: Tokens added per second; a value <= 0 disables limiting
+            capacity: Maximum number of tokens that can be spent in a burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
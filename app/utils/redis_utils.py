@@ -0,0 +1,46 @@
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Optional
+
+from app.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_redis():
+    """Return the process-wide Redis client, or None if Redis is not configured
+    
+    Uses ``Config.REDIS_URL``, which defaults to the Celery broker URL.
+    The client keeps its own connection pool, so it is safe to share.
+    """
+    url = Config.REDIS_URL
+    if not url or not url.startswith(('redis://', 'rediss://', 'unix://')):
+        return None
+    from redis import Redis
+    return Redis.from_url(url)
+
+
+def get_session_storage(prefix: str, secret: Optional[str] = None):
+    """Build a wechatpy session storage backed by the shared Redis
+    
+    Storing access_tokens in Redis lets every worker process reuse one
+    token per application instead of each fetching and caching its own.
+    
+    Args:
+        prefix: Key prefix for the application (e.g. 'wecom')
+        secret: Optional app secret; a short digest of it is added to the
+            prefix so applications sharing an ID get separate tokens
+            
+    Returns:
+        A RedisStorage, or None to fall back to wechatpy's in-memory storage
+    """
+    redis = get_redis()
+    if redis is None:
+        return None
+    from wechatpy.session.redisstorage import RedisStorage
+    if secret:
+        prefix = f"{prefix}:{hashlib.sha1(secret.encode('utf-8')).hexdigest()[:12]}"
+    logger.info("Using Redis session storage for %s", prefix)
+    return RedisStorage(redis, prefix=prefix)
@@ -7,4 +7,8 @@ app = create_app()
 if __name__ == '__main__':
     # Start the Celery worker with the Flask application context
     with app.app_context():
-        celery.worker_main(['worker', '--loglevel=info', '-P', 'solo']) 
\ No newline at end of file
+        # Pool and concurrency come from the Celery config; consume the queues listed
+        # in CELERY_WORKER_QUEUES (all by default), so separate workers with
+        # different lists can give slow providers their own slots
+        celery.worker_main(['worker', '--loglevel=info',
+                            '-Q', app.config['CELERY_WORKER_QUEUES']])